@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import numpy as np
+from src.hybrid_recommender import HybridRecommender
+
+# usage: python benchmark_parallel.py [user_id] [max workers (default: number of cores)]
+user_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+cpu_count = os.cpu_count() or 1
+max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else cpu_count
+repeats = 5
+parity_stride = 25  # also check every 25th trained user against model.predict
+
+# worker counts to try: 1, 2, 4, ... up to max_workers
+worker_counts = [1]
+while worker_counts[-1] * 2 <= max_workers:
+    worker_counts.append(worker_counts[-1] * 2)
+if worker_counts[-1] != max_workers:
+    worker_counts.append(max_workers)
+
+recommender = HybridRecommender(k=30, collaborative_weight=0.7, content_weight=0.3)
+
+# Parity check: the vectorized collaborative scores must equal surprise's model.predict exactly
+all_indices = np.arange(len(recommender.movies_df))
+movie_ids = recommender.movies_df['movieId'].values
+check_users = [user_id] + [recommender.trainset.to_raw_uid(inner_id)
+                           for inner_id in range(0, recommender.trainset.n_users, parity_stride)] + [-1]  # -1: unknown user
+mismatches = 0
+for check_user in check_users:
+    vectorized = recommender._get_collaborative_scores(check_user, all_indices)
+    expected = np.array([recommender.model.predict(check_user, movie_id).est for movie_id in movie_ids])
+    mismatches += int(np.count_nonzero(vectorized != expected))
+print(f"\nParity with model.predict: {len(check_users)} users x {len(movie_ids)} movies, {mismatches} mismatches")
+if mismatches:
+    sys.exit(1)
+
+print(f"\nScoring speedup for user {user_id} on {cpu_count} cores (best of {repeats} runs)")
+print(f"{'backend':>8} {'workers':>8} {'ms':>10} {'speedup':>8}")
+
+for backend in ('thread', 'process'):
+    baseline = None
+    for n_jobs in worker_counts:
+        recommender.configure_parallelism(n_jobs, backend)
+        recommender.get_recommendations(user_id, n=10)  # warm up the pool
+
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            recommender.get_recommendations(user_id, n=10)
+            timings.append(time.perf_counter() - start)
+
+        best = min(timings)
+        if baseline is None:
+            baseline = best
+        print(f"{backend:>8} {n_jobs:>8} {best * 1000:>10.1f} {baseline / best:>7.2f}x")
+
+recommender.close()
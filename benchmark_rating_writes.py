@@ -0,0 +1,110 @@
+import bisect
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from src import database
+from src.database import get_db_connection, create_browse_tables, update_movie_stats
+from src.rating_writer import RatingWriter
+
+# usage: python benchmark_rating_writes.py [ratings] [client threads]
+# Runs against a temporary copy of movielens.db so the real database is untouched.
+num_ratings = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+num_clients = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+tmp_dir = tempfile.mkdtemp()
+database.DATABASE_NAME = os.path.join(tmp_dir, 'movielens.db')
+shutil.copy('movielens.db', database.DATABASE_NAME)
+create_browse_tables()
+
+conn = get_db_connection()
+movie_ids = [row[0] for row in conn.execute('SELECT movieId FROM movies LIMIT 1000')]
+first_user = conn.execute('SELECT MAX(userId) FROM ratings').fetchone()[0] + 1
+conn.close()
+
+
+def per_request_commit(user_id, movie_id, rating, timestamp):
+    # What /add_rating does without write-behind: one transaction (and fsync) per rating
+    conn = get_db_connection()
+    conn.execute(
+        'INSERT OR REPLACE INTO ratings (userId, movieId, rating, timestamp) VALUES (?, ?, ?, ?)',
+        (user_id, movie_id, rating, timestamp)
+    )
+    update_movie_stats(conn, movie_id)
+    conn.commit()
+    conn.close()
+
+
+def run(write, user_offset):
+    # Each client thread plays a new user clicking through the movie grid.
+    # Returns the elapsed time, each write's latency and (submit time, write's return value) pairs.
+    latencies = []
+    submits = []
+    lock = threading.Lock()
+
+    def client(client_id):
+        user_id = first_user + user_offset + client_id
+        for i in range(client_id, num_ratings, num_clients):
+            start = time.perf_counter()
+            result = write(user_id, movie_ids[(i // num_clients) % len(movie_ids)], 4.0, int(time.time()))
+            end = time.perf_counter()
+            with lock:
+                latencies.append(end - start)
+                submits.append((start, result))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(client_id,)) for client_id in range(num_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sorted(latencies), submits
+
+
+def watch_commits(writer, commits, done):
+    # Records (committed sequence number, time) each time a write-behind batch commits
+    committed = 0
+    while not done.is_set():
+        committed = writer.wait_committed(committed, timeout=0.1)
+        commits.append((committed, time.perf_counter()))
+
+
+def report(name, elapsed, latencies):
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{name:<22} {num_ratings / elapsed:>10.0f} {p50:>10.3f} {p99:>10.3f}")
+
+
+print(f"\n{num_ratings} ratings from {num_clients} concurrent clients")
+print(f"{'mode':<22} {'ratings/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+
+elapsed, latencies, _ = run(per_request_commit, 0)
+report('per-request commit', elapsed, latencies)
+
+writer = RatingWriter()
+commits = []
+done = threading.Event()
+watcher = threading.Thread(target=watch_commits, args=(writer, commits, done))
+watcher.start()
+
+start = time.perf_counter()
+elapsed, latencies, submits = run(writer.submit, num_clients)
+report('write-behind (queued)', elapsed, latencies)
+
+# Durable latency: from submit until the batch holding that rating's sequence number committed
+writer.flush(timeout=60)
+durable_elapsed = time.perf_counter() - start
+done.set()
+watcher.join()
+commit_seqs = [seq for seq, _ in commits]
+durable = sorted(
+    commits[bisect.bisect_left(commit_seqs, seq)][1] - submitted
+    for submitted, seq in submits
+)
+report('write-behind (durable)', durable_elapsed, durable)
+writer.close()
+print(f"write-behind committed {writer.stats()['ratings']} ratings in {writer.stats()['batches']} batches")
+
+shutil.rmtree(tmp_dir)
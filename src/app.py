@@ -1,18 +1,210 @@
 from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify
-from surprise import Reader, Dataset, KNNWithMeans
-from src.hybrid_recommender import HybridRecommender
-from src.database import get_db_connection
-import pandas as pd
+from src.database import get_db_connection, create_browse_tables, update_movie_stats, get_movie_page, get_genres, BROWSE_SORTS
+from src.response_cache import ResponseCache
+from src.rating_writer import RatingWriter
+import hashlib
+import threading
 import time
+import os
 
 # Create the Flask application
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 app.secret_key = 'a-super-secret-key-that-you-should-change'
 
-# Initialize the hybrid recommender once when the app starts
-print("Initializing hybrid recommender... this may take a moment.")
-recommender = HybridRecommender(k=30, collaborative_weight=0.7, content_weight=0.3)
-print("Hybrid recommender initialized successfully.")
+# The hybrid recommender is trained in a background thread so the app can serve right away.
+# Until it is ready, recommendation routes fall back to popular movies.
+recommender = None
+model_status = {'state': 'loading', 'error': None}
+# The browse indexes and rating aggregates are migrated/backfilled by the same background thread
+# before training; /readyz stays 503 until both are done.
+browse_status = {'state': 'migrating', 'error': None}
+_model_lock = threading.Lock()
+_model_thread = None
+
+# Rendered responses for model-derived read endpoints, keyed on arguments + model/catalog version
+response_cache = ResponseCache()
+# Set once at startup. The app never writes to the movies table (only data_loader.py does, offline),
+# so the catalog, like the trained model, only changes when the app is restarted.
+catalog_version = None
+
+
+def _prepare_browse_tables():
+    # Creates (and on first run backfills) the browse indexes and aggregate tables.
+    try:
+        start = time.time()
+        create_browse_tables()
+        browse_status['state'] = 'ready'
+        print(f"Browse tables ready in {time.time() - start:.1f}s.")
+    except Exception as e:
+        browse_status['state'] = 'failed'
+        browse_status['error'] = str(e)
+        print(f"Browse table migration failed: {e}")
+
+
+def _start_up():
+    # Background startup work: browse tables first (cheap once migrated), then the model.
+    _prepare_browse_tables()
+    _load_recommender()
+
+
+def _load_recommender():
+    # Imports and trains the hybrid recommender (pulls in pandas, surprise and sklearn).
+    global recommender
+    try:
+        print("Initializing hybrid recommender in the background... this may take a moment.")
+        from src.hybrid_recommender import HybridRecommender
+
+        loaded = HybridRecommender(k=30, collaborative_weight=0.7, content_weight=0.3)
+
+        # Set RECOMMENDER_WORKERS > 1 to score candidates across a thread pool, started here before
+        # the model is published. Scoring is NumPy code that releases the GIL. The process backend
+        # is not available in the app: this loader, the server and the rating writer are already
+        # running threads, and forking with their locks held can deadlock the workers.
+        backend = os.environ.get('RECOMMENDER_BACKEND', 'thread')
+        if backend != 'thread':
+            print(f"RECOMMENDER_BACKEND={backend} is not supported in the web app; using threads.")
+        loaded.configure_parallelism(n_jobs=int(os.environ.get('RECOMMENDER_WORKERS', 1)),
+                                     parallel_backend='thread')
+        recommender = loaded
+        model_status['state'] = 'ready'
+        print("Hybrid recommender initialized successfully.")
+    except Exception as e:
+        model_status['state'] = 'failed'
+        model_status['error'] = str(e)
+        print(f"Hybrid recommender failed to initialize: {e}")
+        return
+
+    # Warming is only an optimization: the model is already serving, so a failure here is just logged
+    try:
+        warm_response_cache()
+    except Exception as e:
+        print(f"Response cache warming failed: {e}")
+
+
+def start_model_loading():
+    # Starts the background startup work (browse table migration, then the model load) once per process.
+    global _model_thread
+    with _model_lock:
+        if _model_thread is None:
+            _model_thread = threading.Thread(target=_start_up, name='model-loader', daemon=True)
+            _model_thread.start()
+
+
+def is_model_ready():
+    return recommender is not None
+
+
+def is_browse_ready():
+    return browse_status['state'] == 'ready'
+
+
+def get_catalog_version():
+    # Fingerprint of the movies table, used to key cached search results (they depend only on the catalog).
+    conn = get_db_connection()
+    num_movies, max_movie_id = conn.execute('SELECT COUNT(*), MAX(movieId) FROM movies').fetchone()
+    conn.close()
+    return f"{num_movies}m-{max_movie_id}"
+
+
+def warm_response_cache(num_movies: int = 50):
+    # Pre-renders the similar-movies pages and search prefixes for the most-rated movies.
+    start = time.time()
+    conn = get_db_connection()
+    popular = conn.execute('''
+        SELECT m.movieId, m.title FROM movie_stats s JOIN movies m ON s.movieId = m.movieId
+        ORDER BY s.num_ratings DESC, s.movieId LIMIT ?
+    ''', (num_movies,)).fetchall()
+    conn.close()
+
+    # Autocomplete sends every prefix as the user types, so warm 2-4 letter prefixes of popular titles
+    prefixes = []
+    for row in popular:
+        word = ''.join(ch for ch in row['title'].split(' ')[0].lower() if ch.isalnum())
+        for length in range(2, min(len(word), 4) + 1):
+            if word[:length] not in prefixes:
+                prefixes.append(word[:length])
+
+    warmed = 0
+    for row in popular:
+        with app.test_request_context(f"/similar/{row['movieId']}"):
+            warmed += response_cache.warm('similar', (row['movieId'], recommender.model_version),
+                                          lambda: render_similar_movies(row['movieId']))
+    for prefix in prefixes:
+        with app.test_request_context('/api/search', query_string={'q': prefix}):
+            warmed += response_cache.warm('search', (prefix, catalog_version),
+                                          lambda: search_results(prefix))
+
+    print(f"Warmed {warmed} cached responses in {time.time() - start:.1f}s.")
+
+
+def get_popular_recommendations(user_id: int, n: int = 10, min_ratings: int = 50):
+    # Fallback while the model warms up: best-rated popular movies the user hasn't rated yet.
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT m.movieId, m.title, m.genres, s.avg_rating, s.num_ratings
+        FROM movie_stats s JOIN movies m ON s.movieId = m.movieId
+        WHERE s.num_ratings >= ?
+          AND s.movieId NOT IN (SELECT movieId FROM ratings WHERE userId = ?)
+        ORDER BY s.avg_rating DESC, s.num_ratings DESC
+        LIMIT ?
+    ''', (min_ratings, user_id, n)).fetchall()
+    conn.close()
+
+    return [{
+        'movieId': row['movieId'],
+        'title': row['title'],
+        'genres': row['genres'],
+        'avg_rating': round(row['avg_rating'], 2),
+        'num_ratings': row['num_ratings']
+    } for row in rows]
+
+
+catalog_version = get_catalog_version()
+start_model_loading()
+
+# Set RATING_WRITE_BEHIND=1 to buffer new ratings and commit them in batches from a writer thread
+rating_writer = RatingWriter() if os.environ.get('RATING_WRITE_BEHIND') == '1' else None
+
+
+# Shown when a user's queued ratings could not be committed in time (writer backlogged or failing)
+RATINGS_NOT_SAVED = "Your latest ratings haven't been saved yet. Please try again in a moment."
+
+
+def wait_for_own_ratings(user_id: int) -> bool:
+    # Read-your-writes: commits the user's buffered ratings before their ratings are read.
+    # Returns False if they are still not committed; callers must not serve or edit stale data then.
+    if rating_writer is not None:
+        return rating_writer.flush_user(user_id)
+    return True
+
+
+@app.route('/healthz')
+def healthz():
+    # Liveness: the web process is up and serving requests.
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: the browse tables are migrated and the hybrid model is trained.
+    if is_browse_ready() and is_model_ready():
+        return jsonify({'status': 'ready', 'model_version': recommender.model_version})
+    failed = 'failed' in (model_status['state'], browse_status['state'])
+    return jsonify({
+        'status': 'failed' if failed else 'loading',
+        'model': model_status['state'],
+        'browse_tables': browse_status['state'],
+        'error': model_status['error'] or browse_status['error']
+    }), 503
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    # Response cache size and hit rates per endpoint (plus rating writer counters in write-behind mode).
+    stats = response_cache.stats()
+    if rating_writer is not None:
+        stats['rating_writer'] = rating_writer.stats()
+    return jsonify(stats)
 
 
 @app.route('/', methods=['GET', 'POST'])
@@ -24,6 +216,9 @@ def home():
             conn = get_db_connection()
             user_exists = conn.execute('SELECT 1 FROM ratings WHERE userId = ? LIMIT 1', (user_id,)).fetchone()
             conn.close()
+            if not user_exists and rating_writer is not None:
+                # A new user's first ratings may still be queued for the next batch
+                user_exists = rating_writer.has_pending(user_id)
 
             if user_exists:
                 session['userId'] = user_id
@@ -44,15 +239,43 @@ def browse_movies():
     if 'userId' not in session:
         conn = get_db_connection()
         max_user_id = conn.execute('SELECT MAX(userId) FROM ratings').fetchone()[0]
+        if rating_writer is not None:
+            # New users only reach the ratings table once their first batch is written
+            max_user_id = max(max_user_id or 0, rating_writer.max_pending_user_id() or 0)
         session['userId'] = (max_user_id or 0) + 1
         conn.close()
         flash(f"Welcome! You have been assigned temporary User ID: {session['userId']}", "success")
 
-    conn = get_db_connection()
-    movies_df = pd.read_sql_query("SELECT movieId, title, genres FROM movies LIMIT 100", conn)
-    conn.close()
-    movie_list = movies_df.to_dict('records')
-    return render_template('movies.html', movies=movie_list)
+    sort, genre, after = _get_browse_args(request.args)
+    try:
+        movie_list, next_cursor = get_movie_page(sort=sort, genre=genre, after=after)
+    except ValueError:
+        flash("Invalid page, starting from the beginning.", "error")
+        return redirect(url_for('browse_movies', sort=sort, genre=genre))
+
+    return render_template('movies.html', movies=movie_list, next_cursor=next_cursor,
+                           sort=sort, genre=genre, genres=get_genres(), sorts=BROWSE_SORTS)
+
+
+@app.route('/api/movies')
+def api_browse_movies():
+    # JSON browse API: /api/movies?sort=popularity&genre=Comedy&after=<cursor>&limit=24
+    sort, genre, after = _get_browse_args(request.args)
+    try:
+        limit = min(max(int(request.args.get('limit', 24)), 1), 100)
+        movie_list, next_cursor = get_movie_page(sort=sort, genre=genre, after=after, limit=limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or cursor.'}), 400
+
+    return jsonify({'movies': movie_list, 'next_cursor': next_cursor})
+
+
+def _get_browse_args(args):
+    # Reads the sort, genre filter and keyset cursor for browsing from a request.
+    sort = args.get('sort', 'movieId')
+    if sort not in BROWSE_SORTS:
+        sort = 'movieId'
+    return sort, args.get('genre') or None, args.get('after') or None
 
 
 @app.route('/add_rating', methods=['POST'])
@@ -66,18 +289,27 @@ def add_rating():
         rating = float(request.form['rating'])
         timestamp = int(time.time())
 
-        # Insert or update the rating in the database
-        conn = get_db_connection()
-        conn.execute(
-            'INSERT OR REPLACE INTO ratings (userId, movieId, rating, timestamp) VALUES (?, ?, ?, ?)',
-            (user_id, movie_id, rating, timestamp)
-        )
-        conn.commit()
-        conn.close()
-        flash(f"Your rating of {rating} ⭐ has been saved to the database!", "success")
+        if rating_writer is not None:
+            # Write-behind: queued and committed with the next batch
+            rating_writer.submit(user_id, movie_id, rating, timestamp)
+            flash(f"Your rating of {rating} ⭐ has been recorded and will be saved shortly!", "success")
+        else:
+            # Insert or update the rating in the database
+            conn = get_db_connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO ratings (userId, movieId, rating, timestamp) VALUES (?, ?, ?, ?)',
+                (user_id, movie_id, rating, timestamp)
+            )
+            update_movie_stats(conn, movie_id)
+            conn.commit()
+            conn.close()
+            flash(f"Your rating of {rating} ⭐ has been saved to the database!", "success")
     except (ValueError, KeyError):
         flash("Invalid rating submission.", "error")
-    return redirect(url_for('browse_movies'))
+
+    # Return to the same page of the catalog
+    sort, genre, after = _get_browse_args(request.form)
+    return redirect(url_for('browse_movies', sort=sort, genre=genre, after=after))
 
 
 @app.route('/edit_rating', methods=['POST'])
@@ -98,6 +330,10 @@ def edit_rating():
             flash("Rating must be between 0.5 and 5.0.", "error")
             return redirect(url_for('my_ratings'))
 
+        if not wait_for_own_ratings(user_id):
+            flash(RATINGS_NOT_SAVED, "error")
+            return redirect(url_for('my_ratings'))
+
         # Update the rating in the database
         conn = get_db_connection()
         cursor = conn.execute(
@@ -112,6 +348,7 @@ def edit_rating():
             movie = conn.execute('SELECT title FROM movies WHERE movieId = ?', (movie_id,)).fetchone()
             movie_title = movie['title'] if movie else f"Movie #{movie_id}"
             flash(f"Updated rating for '{movie_title}' to {new_rating} ⭐", "success")
+            update_movie_stats(conn, movie_id)
 
         conn.commit()
         conn.close()
@@ -130,6 +367,9 @@ def delete_rating(movie_id):
 
     try:
         user_id = session['userId']
+        if not wait_for_own_ratings(user_id):
+            flash(RATINGS_NOT_SAVED, "error")
+            return redirect(url_for('my_ratings'))
 
         conn = get_db_connection()
 
@@ -147,6 +387,7 @@ def delete_rating(movie_id):
             flash("Rating not found.", "error")
         else:
             flash(f"Deleted rating for '{movie_title}'.", "success")
+            update_movie_stats(conn, movie_id)
 
         conn.commit()
         conn.close()
@@ -164,6 +405,13 @@ def search_movies():
     if not query or len(query) < 2:
         return jsonify([])
 
+    # LIKE matching is case-insensitive, so queries differing only in case share an entry
+    return response_cache.respond('search', (query.lower(), catalog_version),
+                                  lambda: search_results(query), max_age=300)
+
+
+def search_results(query: str):
+    # Runs the autocomplete search and returns its JSON response.
     conn = get_db_connection()
     search_query = f"""
            SELECT movieId, title, genres 
@@ -171,10 +419,10 @@ def search_movies():
            WHERE title LIKE ? 
            LIMIT 10
        """
-    movies_df = pd.read_sql_query(search_query, conn, params=(f'%{query}%',))
+    rows = conn.execute(search_query, (f'%{query}%',)).fetchall()
     conn.close()
 
-    results = movies_df.to_dict('records')
+    results = [dict(row) for row in rows]
     return jsonify(results)
 
 @app.route('/recommend')
@@ -185,27 +433,46 @@ def recommend():
         return redirect(url_for('browse_movies'))
 
     user_id = session['userId']
+    if not wait_for_own_ratings(user_id):
+        flash(RATINGS_NOT_SAVED, "error")
+        return redirect(url_for('browse_movies'))
     conn = get_db_connection()
-    user_ratings_df = pd.read_sql_query(
-        f"SELECT userId, movieId, rating FROM ratings WHERE userId = {user_id}",
-        conn
-    )
+    user_ratings = conn.execute(
+        'SELECT movieId, rating FROM ratings WHERE userId = ? ORDER BY movieId', (user_id,)
+    ).fetchall()
 
-    if len(user_ratings_df) < 3:
+    if len(user_ratings) < 3:
         flash("You need to rate at least 3 movies to get recommendations.", "error")
         conn.close()
         return redirect(url_for('browse_movies'))
 
     conn.close()
 
-    # Use the hybrid recommender
+    # Serve popular movies until the hybrid model has finished loading
+    if not is_model_ready():
+        return render_template('recommend.html',
+                               recommendations=get_popular_recommendations(user_id, n=10),
+                               warming_up=True)
+
+    # Users the model wasn't trained on get content-only recommendations that depend on nothing
+    # but their ratings, so cache them per (ratings, model version)
+    if not recommender.is_known_user(user_id):
+        ratings_key = hashlib.sha1(repr([tuple(row) for row in user_ratings]).encode()).hexdigest()
+        return response_cache.respond('recommend', (ratings_key, recommender.model_version),
+                                      lambda: render_recommendations(user_id), max_age=0, private=True)
+
+    return render_recommendations(user_id)
+
+
+def render_recommendations(user_id: int):
+    # Renders the hybrid recommendations page for a user.
     print(f"Generating hybrid recommendations for user {user_id}...")
     predictions = recommender.get_recommendations(user_id, n=10)
 
     # Fetch movie details
     recommendations = []
     if predictions:
-        movie_ids = [pred[0] for pred in predictions]
+        movie_ids = [int(pred[0]) for pred in predictions]
         conn = get_db_connection()
 
         # Handle single movie ID case
@@ -214,9 +481,9 @@ def recommend():
         else:
             query = f"SELECT movieId, title, genres FROM movies WHERE movieId IN {tuple(movie_ids)}"
 
-        movies_df = pd.read_sql_query(query, conn)
+        rows = conn.execute(query).fetchall()
         conn.close()
-        movie_info = movies_df.set_index('movieId').to_dict('index')
+        movie_info = {row['movieId']: dict(row) for row in rows}
 
         for pred in predictions:
             movie_id, hybrid_score, collab_score, content_score = pred
@@ -230,12 +497,22 @@ def recommend():
                     'content_score': round(content_score, 2)
                 })
 
-    return render_template('recommend.html', recommendations=recommendations)
+    return render_template('recommend.html', recommendations=recommendations, warming_up=False)
 
 
 @app.route('/similar/<int:movie_id>')
 def similar_movies(movie_id):
     # Finds movies similar to the given movie based on content features.
+    if not is_model_ready():
+        flash("Recommendations are warming up. Please try again in a moment.", "error")
+        return redirect(url_for('browse_movies'))
+
+    return response_cache.respond('similar', (movie_id, recommender.model_version),
+                                  lambda: render_similar_movies(movie_id), max_age=3600)
+
+
+def render_similar_movies(movie_id: int):
+    # Renders the similar-movies page (or redirects if the movie doesn't exist).
     similar = recommender.get_similar_movies(movie_id, n=10)
 
     if not similar:
@@ -243,14 +520,13 @@ def similar_movies(movie_id):
         return redirect(url_for('browse_movies'))
 
     # Fetch movie details
-    movie_ids = [sim[0] for sim in similar]
+    movie_ids = [int(sim[0]) for sim in similar]
     conn = get_db_connection()
 
     # Get the original movie info
-    original_movie = pd.read_sql_query(
-        f"SELECT title, genres FROM movies WHERE movieId = {movie_id}",
-        conn
-    ).iloc[0]
+    original_movie = conn.execute(
+        'SELECT title, genres FROM movies WHERE movieId = ?', (movie_id,)
+    ).fetchone()
 
     # Get similar movies info
     if len(movie_ids) == 1:
@@ -258,10 +534,10 @@ def similar_movies(movie_id):
     else:
         query = f"SELECT movieId, title, genres FROM movies WHERE movieId IN {tuple(movie_ids)}"
 
-    movies_df = pd.read_sql_query(query, conn)
+    rows = conn.execute(query).fetchall()
     conn.close()
 
-    movie_info = movies_df.set_index('movieId').to_dict('index')
+    movie_info = {row['movieId']: dict(row) for row in rows}
 
     similar_list = []
     for sim in similar:
@@ -286,12 +562,42 @@ def explain_recommendation(movie_id):
         flash("Please log in first!", "error")
         return redirect(url_for('home'))
 
+    if not is_model_ready():
+        return jsonify({'error': 'Recommendations are warming up. Please try again in a moment.'}), 503
+
     user_id = session['userId']
+    if not wait_for_own_ratings(user_id):
+        return jsonify({'error': RATINGS_NOT_SAVED}), 503
     explanation = recommender.explain_recommendation(user_id, movie_id)
 
+    if explanation is None:
+        return jsonify({'error': f'Movie ID {movie_id} not found.'}), 404
+
     return jsonify(explanation)
 
 
+@app.route('/explain/batch')
+def explain_recommendations():
+    # Explains several recommendations in one call, e.g. /explain/batch?ids=1,2,3
+    if 'userId' not in session:
+        return jsonify({'error': 'Please log in first!'}), 401
+
+    if not is_model_ready():
+        return jsonify({'error': 'Recommendations are warming up. Please try again in a moment.'}), 503
+
+    try:
+        movie_ids = [int(movie_id) for movie_id in request.args.get('ids', '').split(',') if movie_id.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of movie IDs.'}), 400
+
+    user_id = session['userId']
+    if not wait_for_own_ratings(user_id):
+        return jsonify({'error': RATINGS_NOT_SAVED}), 503
+    explanations = recommender.explain_recommendations(user_id, movie_ids[:50])
+
+    return jsonify(explanations)
+
+
 @app.route('/my-ratings')
 def my_ratings():
     # Displays a list of all movies rated by the current user.
@@ -300,15 +606,18 @@ def my_ratings():
         return redirect(url_for('browse_movies'))
 
     user_id = session['userId']
+    if not wait_for_own_ratings(user_id):
+        # Still show what is saved, but say that the newest ratings are missing from the list
+        flash(RATINGS_NOT_SAVED, "error")
     conn = get_db_connection()
     query = """
         SELECT m.movieId, m.title, m.genres, r.rating
         FROM ratings r JOIN movies m ON r.movieId = m.movieId
         WHERE r.userId = ? ORDER BY r.timestamp DESC
     """
-    my_ratings_df = pd.read_sql_query(query, conn, params=(user_id,))
+    rows = conn.execute(query, (user_id,)).fetchall()
     conn.close()
-    my_ratings_list = my_ratings_df.to_dict('records')
+    my_ratings_list = [dict(row) for row in rows]
 
     return render_template('my_ratings.html', ratings=my_ratings_list)
 
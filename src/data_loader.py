@@ -1,6 +1,6 @@
 import pandas as pd
 import sqlite3
-from src.database import DATABASE_NAME, create_tables
+from src.database import DATABASE_NAME, create_tables, create_browse_tables, rebuild_browse_tables
 
 
 def load_movielens_data():
@@ -26,6 +26,10 @@ def load_movielens_data():
     movies_df.to_sql('movies', conn, if_exists='replace', index=False)
     ratings_df.to_sql('ratings', conn, if_exists='replace', index=False)
 
+    # Replacing the tables drops their indexes, so recreate them and refresh the aggregates
+    create_browse_tables(conn)
+    rebuild_browse_tables(conn)
+
     print("MovieLens data loaded into the database successfully.")
     conn.close()
 
@@ -1,5 +1,6 @@
+import base64
+import json
 import sqlite3
-import pandas as pd
 
 DATABASE_NAME = 'movielens.db'
 
@@ -39,5 +40,205 @@ def create_tables():
                        );
                    ''')
     conn.commit()
+
+    create_browse_tables(conn)
+    conn.close()
+    print("Tables created successfully.")
+
+def create_browse_tables(conn=None):
+    # Creates the indexes, genre table and per-movie rating aggregates used for browsing,
+    # and backfills them if they are empty. A no-op once migrated. Everything runs in one
+    # transaction, so an interrupted migration leaves nothing behind and starts over next time.
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+
+    # Older databases have movie_genres without the copied sort keys; rebuild those
+    genre_columns = [row[1] for row in conn.execute('PRAGMA table_info(movie_genres)')]
+    needs_rebuild = bool(genre_columns) and not {'title', 'num_ratings', 'avg_rating'} <= set(genre_columns)
+
+    conn.executescript(('BEGIN; DROP TABLE movie_genres;' if needs_rebuild else 'BEGIN;') + '''
+        CREATE INDEX IF NOT EXISTS idx_movies_movie_id ON movies(movieId);
+        CREATE INDEX IF NOT EXISTS idx_movies_title ON movies(title, movieId);
+        CREATE INDEX IF NOT EXISTS idx_ratings_movie_id ON ratings(movieId);
+        CREATE INDEX IF NOT EXISTS idx_ratings_user_id ON ratings(userId, movieId);
+
+        CREATE TABLE IF NOT EXISTS movie_stats
+        (
+            movieId INTEGER PRIMARY KEY,
+            num_ratings INTEGER NOT NULL,
+            avg_rating REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_movie_stats_popularity ON movie_stats(num_ratings DESC, movieId);
+        CREATE INDEX IF NOT EXISTS idx_movie_stats_rating ON movie_stats(avg_rating DESC, movieId);
+
+        -- One row per (genre, movie), with the movie's sort keys copied in so that genre-filtered
+        -- pages are index range scans for every sort
+        CREATE TABLE IF NOT EXISTS movie_genres
+        (
+            genre TEXT NOT NULL,
+            movieId INTEGER NOT NULL,
+            title TEXT NOT NULL DEFAULT '',
+            num_ratings INTEGER NOT NULL DEFAULT 0,
+            avg_rating REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (genre, movieId)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_movie_genres_movie_id ON movie_genres(movieId);
+        CREATE INDEX IF NOT EXISTS idx_movie_genres_title ON movie_genres(genre, title, movieId);
+        CREATE INDEX IF NOT EXISTS idx_movie_genres_popularity ON movie_genres(genre, num_ratings DESC, movieId);
+        CREATE INDEX IF NOT EXISTS idx_movie_genres_rating ON movie_genres(genre, avg_rating DESC, movieId);
+    ''')
+
+    try:
+        if needs_rebuild or conn.execute('SELECT 1 FROM movie_stats LIMIT 1').fetchone() is None:
+            rebuild_browse_tables(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def rebuild_browse_tables(conn):
+    # Recomputes movie_stats and movie_genres from the movies and ratings tables.
+    print("Building movie genre and rating aggregate tables...")
+
+    conn.execute('DELETE FROM movie_stats')
+    conn.execute('''
+        INSERT INTO movie_stats (movieId, num_ratings, avg_rating)
+        SELECT m.movieId, COUNT(r.rating), COALESCE(AVG(r.rating), 0)
+        FROM movies m LEFT JOIN ratings r ON r.movieId = m.movieId
+        GROUP BY m.movieId
+    ''')
+
+    conn.execute('DELETE FROM movie_genres')
+    conn.executemany(
+        'INSERT OR IGNORE INTO movie_genres (genre, movieId, title) VALUES (?, ?, ?)',
+        [
+            (genre, movie_id, title)
+            for movie_id, title, genres in conn.execute('SELECT movieId, title, genres FROM movies')
+            for genre in (genres or '').split('|')
+            if genre and genre != '(no genres listed)'
+        ]
+    )
+    conn.execute('''
+        UPDATE movie_genres SET (num_ratings, avg_rating) =
+            (SELECT s.num_ratings, s.avg_rating FROM movie_stats s WHERE s.movieId = movie_genres.movieId)
+        WHERE movieId IN (SELECT movieId FROM movie_stats)
+    ''')
+    conn.commit()
+
+
+def update_movie_stats(conn, movie_id: int):
+    # Refreshes one movie's rating aggregates (and their copies in movie_genres);
+    # call in the same transaction as a rating write.
+    conn.execute('''
+        INSERT OR REPLACE INTO movie_stats (movieId, num_ratings, avg_rating)
+        SELECT ?, COUNT(rating), COALESCE(AVG(rating), 0)
+        FROM ratings WHERE movieId = ?
+    ''', (movie_id, movie_id))
+    conn.execute('''
+        UPDATE movie_genres SET (num_ratings, avg_rating) =
+            (SELECT num_ratings, avg_rating FROM movie_stats WHERE movieId = ?)
+        WHERE movieId = ?
+    ''', (movie_id, movie_id))
+
+
+# Sort options for browsing: (column, descending?, cursor value types)
+BROWSE_SORTS = {
+    'movieId': ('movieId', False, (int,)),
+    'title': ('title', False, (str,)),
+    'popularity': ('num_ratings', True, (int,)),
+    'rating': ('avg_rating', True, (int, float)),
+}
+
+
+def encode_browse_cursor(sort_value, movie_id) -> str:
+    # Opaque keyset cursor: the last row's sort value and movieId.
+    return base64.urlsafe_b64encode(json.dumps([sort_value, movie_id]).encode()).decode()
+
+
+def decode_browse_cursor(cursor: str, sort: str = 'movieId'):
+    # Raises ValueError unless the cursor holds a sort value of the right type for sort and a movieId.
+    try:
+        sort_value, movie_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid browse cursor '{cursor}'")
+
+    value_types = BROWSE_SORTS[sort][2]
+    if isinstance(sort_value, bool) or not isinstance(sort_value, value_types) \
+            or isinstance(movie_id, bool) or not isinstance(movie_id, int):
+        raise ValueError(f"Invalid browse cursor '{cursor}' for sort '{sort}'")
+
+    return sort_value, movie_id
+
+
+def get_movie_page(sort: str = 'movieId', genre: str = None, after: str = None, limit: int = 24):
+    # Returns (movies, next_cursor) for one page of the catalog using keyset pagination.
+    # The query is driven by the table whose index matches (genre, sort key, movieId), so each
+    # page is an index range scan that starts where the previous one ended.
+    if sort not in BROWSE_SORTS:
+        raise ValueError(f"Unknown sort '{sort}'")
+
+    column, descending, _ = BROWSE_SORTS[sort]
+    clauses = []
+    params = []
+
+    if genre:
+        key = 'g'
+        source = '''movie_genres g
+            JOIN movies m ON m.movieId = g.movieId
+            JOIN movie_stats s ON s.movieId = g.movieId'''
+        clauses.append('g.genre = ?')
+        params.append(genre)
+    elif column in ('num_ratings', 'avg_rating'):
+        key = 's'
+        source = 'movie_stats s JOIN movies m ON m.movieId = s.movieId'
+    else:
+        key = 'm'
+        source = 'movies m JOIN movie_stats s ON s.movieId = m.movieId'
+
+    if after:
+        last_value, last_movie_id = decode_browse_cursor(after, sort)
+        if column == 'movieId':
+            clauses.append(f'{key}.movieId > ?')
+            params.append(last_movie_id)
+        else:
+            # Ties on the sort key are broken by ascending movieId
+            compare = '<' if descending else '>'
+            clauses.append(f'{key}.{column} {compare}= ? AND ({key}.{column} {compare} ? OR {key}.movieId > ?)')
+            params.extend([last_value, last_value, last_movie_id])
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    if column == 'movieId':
+        order = f'{key}.movieId ASC'
+    else:
+        order = f"{key}.{column} {'DESC' if descending else 'ASC'}, {key}.movieId ASC"
+
+    conn = get_db_connection()
+    rows = conn.execute(f'''
+        SELECT m.movieId, m.title, m.genres, s.num_ratings, s.avg_rating
+        FROM {source}
+        {where}
+        ORDER BY {order}
+        LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+    conn.close()
+
+    movies = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = movies[-1]
+        next_cursor = encode_browse_cursor(last[column], last['movieId'])
+
+    return movies, next_cursor
+
+
+def get_genres():
+    # Lists all genres for the browse filter.
+    conn = get_db_connection()
+    genres = [row['genre'] for row in conn.execute('SELECT DISTINCT genre FROM movie_genres ORDER BY genre')]
     conn.close()
-    print("Tables created successfully.")
\ No newline at end of file
+    return genres
@@ -0,0 +1,208 @@
+import argparse
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.database import get_db_connection
+from src.hybrid_recommender import HybridRecommender, build_content_similarity
+
+# Train/test split and content index shared with forked grid workers (read-only after fork)
+_shared = {}
+
+
+def load_ratings():
+    # Loads all ratings (with timestamps) and movies from the database.
+    conn = get_db_connection()
+    ratings_df = pd.read_sql_query("SELECT userId, movieId, rating, timestamp FROM ratings", conn)
+    movies_df = pd.read_sql_query("SELECT movieId, title, genres FROM movies", conn)
+    conn.close()
+
+    # Keep only the latest rating if a user rated the same movie more than once
+    ratings_df = ratings_df.sort_values('timestamp').drop_duplicates(['userId', 'movieId'], keep='last')
+    return ratings_df.reset_index(drop=True), movies_df
+
+
+def split_by_user(ratings_df: pd.DataFrame, test_fraction: float = 0.2, min_ratings: int = 5, seed: int = 42):
+    # Holds out a random test_fraction of each user's ratings (users with at least min_ratings).
+    rng = np.random.default_rng(seed)
+    shuffled_rank = (
+        ratings_df.assign(_order=rng.random(len(ratings_df)))
+        .groupby('userId')['_order']
+        .rank(method='first')
+    )
+    counts = ratings_df.groupby('userId')['movieId'].transform('count')
+    test_mask = (counts >= min_ratings) & (shuffled_rank <= np.floor(counts * test_fraction))
+
+    return ratings_df[~test_mask].reset_index(drop=True), ratings_df[test_mask].reset_index(drop=True)
+
+
+def split_by_time(ratings_df: pd.DataFrame, test_fraction: float = 0.2):
+    # Holds out the most recent test_fraction of all ratings. Test users must also appear in training.
+    cutoff = ratings_df['timestamp'].quantile(1 - test_fraction)
+    train_df = ratings_df[ratings_df['timestamp'] < cutoff]
+    test_df = ratings_df[(ratings_df['timestamp'] >= cutoff) & ratings_df['userId'].isin(train_df['userId'])]
+
+    return train_df.reset_index(drop=True), test_df.reset_index(drop=True)
+
+
+def ranking_metrics(ranked_movie_ids, relevant_movie_ids: set, n: int):
+    # Precision@n, recall@n and NDCG@n (binary relevance) for one user.
+    hits = [1.0 if movie_id in relevant_movie_ids else 0.0 for movie_id in ranked_movie_ids[:n]]
+
+    precision = sum(hits) / n
+    recall = sum(hits) / len(relevant_movie_ids)
+    dcg = sum(hit / math.log2(rank + 2) for rank, hit in enumerate(hits))
+    idcg = sum(1.0 / math.log2(rank + 2) for rank in range(min(len(relevant_movie_ids), n)))
+
+    return precision, recall, dcg / idcg
+
+
+def evaluate_recommender(recommender: HybridRecommender, test_df: pd.DataFrame, weight_grid,
+                         n: int = 10, relevance_threshold: float = 4.0, user_ids=None):
+    # Evaluates one fitted recommender for every (collaborative_weight, content_weight) pair.
+    # Each user's candidates (every movie they have not rated in training) are scored once; only
+    # the weighted sum changes per pair. Latency is measured on get_recommendations, the call the
+    # app serves, with this recommender's parallelism settings.
+    if user_ids is None:
+        user_ids = test_df['userId'].unique()
+
+    test_by_user = {user_id: group for user_id, group in test_df.groupby('userId')}
+    squared_errors = {weights: [] for weights in weight_grid}
+    ranking = {weights: [] for weights in weight_grid}
+    latencies = []
+
+    for user_id in user_ids:
+        user_test = test_by_user.get(user_id)
+        if user_test is None:
+            continue
+
+        start = time.perf_counter()
+        recommender.get_recommendations(user_id, n=n)
+        latencies.append(time.perf_counter() - start)
+
+        scores = recommender.get_candidate_scores(user_id)
+        if not scores:
+            continue
+
+        movie_ids = np.array([score[0] for score in scores])
+        collab_scores = np.array([score[2] for score in scores])
+        content_scores = np.array([score[3] for score in scores])
+        position = {movie_id: idx for idx, movie_id in enumerate(movie_ids)}
+
+        # Held-out ratings we have a prediction for (all of them, unless a movie is missing from the
+        # catalog), and the relevant ones for ranking
+        test_positions = [position[movie_id] for movie_id in user_test['movieId'] if movie_id in position]
+        actual = np.array([rating for movie_id, rating in zip(user_test['movieId'], user_test['rating'])
+                           if movie_id in position])
+        relevant = set(user_test.loc[user_test['rating'] >= relevance_threshold, 'movieId'])
+
+        for weights in weight_grid:
+            collaborative_weight, content_weight = weights
+            hybrid_scores = collaborative_weight * collab_scores + content_weight * content_scores
+
+            if test_positions:
+                squared_errors[weights].extend((hybrid_scores[test_positions] - actual) ** 2)
+
+            if relevant:
+                top_n = movie_ids[np.argsort(-hybrid_scores, kind='stable')[:n]]
+                ranking[weights].append(ranking_metrics(list(top_n), relevant, n))
+
+    results = []
+    for weights in weight_grid:
+        user_metrics = np.array(ranking[weights]) if ranking[weights] else np.zeros((1, 3))
+        results.append({
+            'collaborative_weight': weights[0],
+            'content_weight': weights[1],
+            'rmse': float(np.sqrt(np.mean(squared_errors[weights]))) if squared_errors[weights] else float('nan'),
+            f'precision@{n}': float(user_metrics[:, 0].mean()),
+            f'recall@{n}': float(user_metrics[:, 1].mean()),
+            f'ndcg@{n}': float(user_metrics[:, 2].mean()),
+            'users': len(ranking[weights]),
+            'latency_p50_ms': float(np.percentile(latencies, 50) * 1000) if latencies else float('nan'),
+            'latency_p95_ms': float(np.percentile(latencies, 95) * 1000) if latencies else float('nan'),
+        })
+    return results
+
+
+def _evaluate_k(k: int):
+    # Grid worker: fits the collaborative model for one k and evaluates every weight pair.
+    start = time.perf_counter()
+    recommender = HybridRecommender(
+        k=k,
+        ratings_df=_shared['train_df'],
+        movies_df=_shared['movies_df'],
+        content_similarity_matrix=_shared['content_similarity_matrix']
+    )
+    fit_seconds = time.perf_counter() - start
+
+    results = evaluate_recommender(recommender, _shared['test_df'], _shared['weight_grid'],
+                                   n=_shared['n'], user_ids=_shared['user_ids'])
+    for result in results:
+        result['k'] = k
+        result['fit_seconds'] = round(fit_seconds, 2)
+    return results
+
+
+def run_grid(k_values, weight_grid, split: str = 'user', test_fraction: float = 0.2, n: int = 10,
+             workers: int = None, max_users: int = None, seed: int = 42) -> pd.DataFrame:
+    # Evaluates every (k, weights) combination. Each k is fitted once in its own worker process;
+    # the content index is built once here and shared with the workers through fork.
+    ratings_df, movies_df = load_ratings()
+
+    if split == 'time':
+        train_df, test_df = split_by_time(ratings_df, test_fraction)
+    else:
+        train_df, test_df = split_by_user(ratings_df, test_fraction, seed=seed)
+
+    user_ids = test_df['userId'].unique()
+    if max_users is not None and len(user_ids) > max_users:
+        user_ids = np.random.default_rng(seed).choice(user_ids, size=max_users, replace=False)
+
+    print(f"Split '{split}': {len(train_df)} training ratings, {len(test_df)} test ratings, "
+          f"{len(user_ids)} users evaluated.")
+
+    movies_df = movies_df.reset_index(drop=True)
+    _shared.update({
+        'train_df': train_df,
+        'test_df': test_df,
+        'movies_df': movies_df,
+        'content_similarity_matrix': build_content_similarity(movies_df),
+        'weight_grid': [tuple(weights) for weights in weight_grid],
+        'n': n,
+        'user_ids': user_ids,
+    })
+
+    workers = min(workers or multiprocessing.cpu_count(), len(k_values))
+    if workers <= 1:
+        grid_results = [_evaluate_k(k) for k in k_values]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            grid_results = list(pool.map(_evaluate_k, k_values))
+
+    columns = ['k', 'collaborative_weight', 'content_weight', 'rmse', f'precision@{n}', f'recall@{n}',
+               f'ndcg@{n}', 'users', 'latency_p50_ms', 'latency_p95_ms', 'fit_seconds']
+    results_df = pd.DataFrame([result for results in grid_results for result in results])[columns]
+    return results_df.sort_values(f'ndcg@{n}', ascending=False).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    # e.g. python -m src.evaluation --k 20 30 40 --weights 0.5 0.7 0.9 --workers 3 --max-users 200
+    parser = argparse.ArgumentParser(description="Offline evaluation of the hybrid recommender.")
+    parser.add_argument('--k', type=int, nargs='+', default=[20, 30, 40], help="neighborhood sizes to try")
+    parser.add_argument('--weights', type=float, nargs='+', default=[0.5, 0.6, 0.7, 0.8, 0.9, 1.0],
+                        help="collaborative weights to try (content weight = 1 - collaborative weight)")
+    parser.add_argument('--split', choices=['user', 'time'], default='user')
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--n', type=int, default=10, help="list length for precision/recall/NDCG")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per k)")
+    parser.add_argument('--max-users', type=int, default=None, help="evaluate a random sample of users")
+    args = parser.parse_args()
+
+    grid = [(weight, round(1.0 - weight, 2)) for weight in args.weights]
+    results = run_grid(args.k, grid, split=args.split, test_fraction=args.test_fraction, n=args.n,
+                       workers=args.workers, max_users=args.max_users)
+
+    pd.set_option('display.width', 200)
+    print(results.round(4).to_string(index=False))
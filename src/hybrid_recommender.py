@@ -1,3 +1,9 @@
+import heapq
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 from surprise import Dataset, Reader, KNNWithMeans
@@ -5,12 +11,59 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from src.database import get_db_connection
 
+# Inside a process pool worker: that worker's copy of the recommender it serves (set by the
+# pool initializer, so each recommender's pool is bound to its own instance)
+_worker_recommender = None
+
+
+def _init_worker(recommender):
+    global _worker_recommender
+    _worker_recommender = recommender
+
+
+def _worker_pid(_):
+    return os.getpid()
+
+
+def _score_partition_in_worker(user_id, movie_ids, rated_indices, rated_weights, n):
+    # Runs inside a process pool worker; scores one partition of the candidates.
+    return _worker_recommender._score_movies(user_id, movie_ids, rated_indices, rated_weights, n)
+
+
+def build_content_similarity(movies_df: pd.DataFrame) -> np.ndarray:
+    # Builds the movie x movie content similarity matrix (row order follows movies_df).
+    movies_df['content_features'] = movies_df['genres'].fillna('')
+
+  # do the same for other categories (WIP)
+    # movies_df['content_features'] = (
+    #     movies_df['genres'].fillna('') + ' ' +
+    #     movies_df['cast'].fillna('') + ' ' +
+    #     movies_df['keywords'].fillna('')
+    # )
+
+    # Use TF-IDF to vectorize content features
+    tfidf = TfidfVectorizer(
+        token_pattern=r'[A-Za-z0-9]+',  # Handle pipe-separated genres
+        lowercase=True,
+        stop_words='english'
+    )
+
+    tfidf_matrix = tfidf.fit_transform(movies_df['content_features'])
+
+    # Calculate cosine similarity matrix
+    return cosine_similarity(tfidf_matrix, tfidf_matrix)
+
 
 class HybridRecommender:
 
     #Collaborative and Content-Based Filtering (genre)
 
-    def __init__(self, k=30, collaborative_weight=0.7, content_weight=0.3):
+    def __init__(self, k=30, collaborative_weight=0.7, content_weight=0.3,
+                 n_jobs=1, parallel_backend='thread',
+                 ratings_df: pd.DataFrame = None, movies_df: pd.DataFrame = None,
+                 content_similarity_matrix: np.ndarray = None):
+        # ratings_df / movies_df train on in-memory data instead of the database (used for
+        # offline evaluation); content_similarity_matrix reuses an already built content index.
 
         self.collaborative_weight = collaborative_weight
         self.content_weight = content_weight
@@ -20,18 +73,76 @@ class HybridRecommender:
         self.movies_df = None
         self.content_similarity_matrix = None
         self.movie_id_to_index = None
+        self.model_version = None
+        self._user_ratings = None
+
+        # Parallel scoring settings (n_jobs=1 keeps the single-threaded path)
+        self.n_jobs = 1
+        self.parallel_backend = 'thread'
+        self._executor = None
+
+        self._load_and_train(k=k, ratings_df=ratings_df, movies_df=movies_df,
+                             content_similarity_matrix=content_similarity_matrix)
+
+        # Pool starts right after training, before anyone else can use this instance
+        self.configure_parallelism(n_jobs, parallel_backend)
+
+    def configure_parallelism(self, n_jobs: int = 1, parallel_backend: str = 'thread'):
+        # Sets how many workers score candidates per request and which pool type to use, and
+        # starts the pool right away. The process backend forks here, so it is only safe while
+        # this is the only thread in the process: a child that inherits a lock another thread
+        # holds (stdout, logging, sqlite) deadlocks. It is meant for scripts like
+        # benchmark_parallel.py; inside the web app use the thread backend.
+        if parallel_backend not in ('thread', 'process'):
+            raise ValueError("parallel_backend must be 'thread' or 'process'")
+        if parallel_backend == 'process' and n_jobs > 1 and threading.active_count() > 1:
+            raise RuntimeError("The process backend must be started before any other thread; "
+                               "use parallel_backend='thread' in multi-threaded programs")
+
+        self.close()
+        self.n_jobs = max(1, int(n_jobs))
+        self.parallel_backend = parallel_backend
+
+        if self.n_jobs == 1:
+            return
+
+        if self.parallel_backend == 'process':
+            # Fork so workers inherit the trained model and similarity matrix without pickling
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker,
+                initargs=(self,)
+            )
+            # Fork every worker now rather than on the first request
+            list(self._executor.map(_worker_pid, range(self.n_jobs)))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.n_jobs)
 
-        self._load_and_train(k=k)
+    def close(self):
+        # Shuts down the worker pool, if one was started.
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
 
-    def _load_and_train(self, k: int):
+    def _load_and_train(self, k: int, ratings_df: pd.DataFrame = None, movies_df: pd.DataFrame = None,
+                        content_similarity_matrix: np.ndarray = None):
         #Loads and train data for both collaborative and content-based models.
         print("Loading data and training hybrid model...")
 
-        # Load data from the database
-        conn = get_db_connection()
-        ratings_df = pd.read_sql_query("SELECT userId, movieId, rating FROM ratings", conn)
-        self.movies_df = pd.read_sql_query("SELECT movieId, title, genres FROM movies", conn)
-        conn.close()
+        if ratings_df is None or movies_df is None:
+            # Load data from the database
+            conn = get_db_connection()
+            ratings_df = pd.read_sql_query("SELECT userId, movieId, rating FROM ratings", conn)
+            self.movies_df = pd.read_sql_query("SELECT movieId, title, genres FROM movies", conn)
+            conn.close()
+        else:
+            # Serve user ratings from the given data so nothing outside it leaks in
+            self.movies_df = movies_df.reset_index(drop=True)
+            self._user_ratings = {
+                user_id: group[['movieId', 'rating']].reset_index(drop=True)
+                for user_id, group in ratings_df.groupby('userId')
+            }
 
         self.all_movie_ids = set(self.movies_df['movieId'].unique())
 
@@ -42,7 +153,13 @@ class HybridRecommender:
         self._train_collaborative_model(ratings_df, k)
 
         # building Content-Based Similarity Matrix
-        self._build_content_similarity()
+        if content_similarity_matrix is None:
+            self._build_content_similarity()
+        else:
+            self.content_similarity_matrix = content_similarity_matrix
+
+        # Identifies this trained model (data size + training time) for readiness checks
+        self.model_version = f"{len(ratings_df)}r-{len(self.movies_df)}m-{int(time.time())}"
 
         print("Hybrid model training complete.")
 
@@ -62,86 +179,114 @@ class HybridRecommender:
         self.model = KNNWithMeans(k=k, sim_options=sim_options, verbose=False)
         self.model.fit(self.trainset)
 
+        # Each item's raters and their rating deviations (r - rater mean) as flat arrays, so
+        # collaborative estimates for a batch of movies run as NumPy operations
+        item_lengths = np.array([len(self.trainset.ir[inner_id]) for inner_id in range(self.trainset.n_items)])
+        self._item_offsets = np.concatenate(([0], np.cumsum(item_lengths)))
+        self._item_raters = np.array(
+            [rater for inner_id in range(self.trainset.n_items) for rater, _ in self.trainset.ir[inner_id]],
+            dtype=np.int64
+        )
+        self._item_ratings = np.array(
+            [rating for inner_id in range(self.trainset.n_items) for _, rating in self.trainset.ir[inner_id]],
+            dtype=np.float64
+        )
+        self._item_deviations = self._item_ratings - self.model.means[self._item_raters]
+
+        # Inner item id for every movie in catalog order (-1 if the movie has no ratings)
+        self._catalog_inner_ids = np.array(
+            [self._get_inner_item_id(movie_id) for movie_id in self.movies_df['movieId']],
+            dtype=np.int64
+        )
+
         print("Collaborative filtering model trained.")
 
+    def _get_inner_item_id(self, movie_id: int) -> int:
+        try:
+            return self.trainset.to_inner_iid(movie_id)
+        except ValueError:
+            return -1
+
     def _build_content_similarity(self):
         # Content-based similarity matrix using different categories (genres for now. perhaps cast and keywords later??)
         print("Building content-based similarity matrix...")
 
-
-        self.movies_df['content_features'] = self.movies_df['genres'].fillna('')
-
-      # do the same for other categories (WIP)
-        # self.movies_df['content_features'] = (
-        #     self.movies_df['genres'].fillna('') + ' ' +
-        #     self.movies_df['cast'].fillna('') + ' ' +
-        #     self.movies_df['keywords'].fillna('')
-        # )
-
-        # Use TF-IDF to vectorize content features
-        tfidf = TfidfVectorizer(
-            token_pattern=r'[A-Za-z0-9]+',  # Handle pipe-separated genres
-            lowercase=True,
-            stop_words='english'
-        )
-
-        tfidf_matrix = tfidf.fit_transform(self.movies_df['content_features'])
-
-        # Calculate cosine similarity matrix
-        self.content_similarity_matrix = cosine_similarity(tfidf_matrix, tfidf_matrix)
+        self.content_similarity_matrix = build_content_similarity(self.movies_df)
 
         print("Content-based similarity matrix built.")
 
-    def _get_collaborative_score(self, user_id: int, movie_id: int) -> float:
-        # Get collaborative filtering prediction score for a movie.
+    def is_known_user(self, user_id: int) -> bool:
+        # True if the collaborative model was trained on this user's ratings.
         try:
-            pred = self.model.predict(uid=user_id, iid=movie_id)
-            return pred.est
-        except:
-            # Return neutral score if prediction failed
-            return 3.0
-
-    def _get_content_score(self, user_id: int, movie_id: int, rated_movie_ids: set,
-                           user_ratings_cache: pd.DataFrame = None) -> float:
-
-        if movie_id not in self.movie_id_to_index:
-            return 0.0
+            self.trainset.to_inner_uid(user_id)
+            return True
+        except ValueError:
+            return False
 
-        movie_idx = self.movie_id_to_index[movie_id]
+    def _get_user_ratings(self, user_id: int) -> pd.DataFrame:
+        # Returns the user's (movieId, rating) rows from the training data or the database.
+        if self._user_ratings is not None:
+            return self._user_ratings.get(user_id, pd.DataFrame(columns=['movieId', 'rating']))
 
-        # Use cached ratings if provided, otherwise query database
-        if user_ratings_cache is None:
-            conn = get_db_connection()
-            user_ratings = pd.read_sql_query(
-                f"SELECT movieId, rating FROM ratings WHERE userId = {user_id}",
-                conn
-            )
-            conn.close()
-        else:
-            user_ratings = user_ratings_cache
-
-        if len(user_ratings) == 0:
-            return 0.0
+        conn = get_db_connection()
+        user_ratings = pd.read_sql_query(
+            "SELECT movieId, rating FROM ratings WHERE userId = ?",
+            conn,
+            params=(user_id,)
+        )
+        conn.close()
+        return user_ratings
+
+    def _select_neighbors(self, inner_user_id: int, items: np.ndarray):
+        # KNNWithMeans.estimate's neighbor selection for a batch of inner item ids: per item, the k
+        # raters most similar to the user, keeping those with positive similarity. Returns the item
+        # position, the index into the _item_* arrays and the similarity of every selected neighbor,
+        # grouped by item and ordered like estimate adds them up.
+        starts = self._item_offsets[items]
+        lengths = self._item_offsets[items + 1] - starts
+        group_starts = np.cumsum(lengths) - lengths
+        group = np.repeat(np.arange(len(items)), lengths)
+        entries = np.arange(lengths.sum()) - group_starts[group] + starts[group]
+
+        # Most similar first (stable, so ties keep rating order like heapq.nlargest)
+        sims = self.model.sim[inner_user_id, self._item_raters[entries]]
+        order = np.lexsort((-sims, group))
+        sims = sims[order]
+        entries = entries[order]
+        rank = np.arange(len(order)) - group_starts[group]
+        keep = (rank < self.model.k) & (sims > 0)
+
+        return group[keep], entries[keep], sims[keep]
+
+    def _get_collaborative_scores(self, user_id: int, movie_indices: np.ndarray) -> np.ndarray:
+        # Array version of KNNWithMeans.predict for many movies at once (same neighbors, same
+        # order of additions, same clipping), so partitions can run in parallel threads.
+        lower_bound, higher_bound = self.trainset.rating_scale
+        scores = np.full(len(movie_indices), float(np.clip(self.trainset.global_mean, lower_bound, higher_bound)))
 
-        # Calculate weighted similarity based on user's ratings
-        similarity_scores = []
+        try:
+            inner_user_id = self.trainset.to_inner_uid(user_id)
+        except ValueError:
+            # Unknown user: predict falls back to the global mean
+            return scores
 
-        for _, row in user_ratings.iterrows():
-            rated_movie_id = row['movieId']
-            rating = row['rating']
+        inner_movie_ids = self._catalog_inner_ids[movie_indices]
+        known = np.flatnonzero(inner_movie_ids >= 0)
+        group, entries, sims = self._select_neighbors(inner_user_id, inner_movie_ids[known])
 
-            if rated_movie_id in self.movie_id_to_index:
-                rated_movie_idx = self.movie_id_to_index[rated_movie_id]
-                similarity = self.content_similarity_matrix[movie_idx][rated_movie_idx]
+        sum_sim = np.bincount(group, weights=sims, minlength=len(known))
+        sum_ratings = np.bincount(group, weights=sims * self._item_deviations[entries], minlength=len(known))
+        actual_k = np.bincount(group, minlength=len(known))
 
-                # Weight similarity by the user's rating (higher rated movies have more influence)
-                weighted_similarity = similarity * (rating / 5.0)
-                similarity_scores.append(weighted_similarity)
+        # Fewer than min_k neighbors, or no positive similarity: the estimate is the user's mean
+        adjustment = np.zeros(len(known))
+        np.divide(sum_ratings, sum_sim, out=adjustment, where=(actual_k >= self.model.min_k) & (sum_sim != 0))
 
-        # Return average weighted similarity
-        return np.mean(similarity_scores) if similarity_scores else 0.0
+        scores[known] = np.clip(self.model.means[inner_user_id] + adjustment, lower_bound, higher_bound)
+        return scores
 
-    def get_recommendations(self, user_id: int, n: int = 10):
+    def _get_candidates(self, user_id: int):
+        # Returns the unrated movies to score and the user's rated profile for content scoring.
 
         try:
             # Get movies the user has already rated
@@ -154,53 +299,97 @@ class HybridRecommender:
             rated_movie_ids = set()
 
             # Get any ratings this user might have from database
-            conn = get_db_connection()
-            user_ratings = pd.read_sql_query(
-                f"SELECT movieId FROM ratings WHERE userId = {user_id}",
-                conn
-            )
-            conn.close()
+            user_ratings = self._get_user_ratings(user_id)
 
             if len(user_ratings) > 0:
                 rated_movie_ids = set(user_ratings['movieId'])
 
-        # Filter out already-rated movies
+        # Filter out already-rated movies; every remaining movie is scored
         movies_to_predict = self.all_movie_ids - rated_movie_ids
 
-        # Limit predictions for faster responses
-        if len(movies_to_predict) > 10000:
-            print(f"Limiting predictions to 10000 movies for speed")
-            movies_to_predict = list(movies_to_predict)[:10000]
-
         # Cache user ratings once to avoid querying for every movie
-        conn = get_db_connection()
-        user_ratings_cache = pd.read_sql_query(
-            f"SELECT movieId, rating FROM ratings WHERE userId = {user_id}",
-            conn
-        )
-        conn.close()
+        user_ratings_cache = self._get_user_ratings(user_id)
 
-        # Generate hybrid scores
-        predictions = []
-        for movie_id in movies_to_predict:
-            # Get collaborative filtering score
-            collab_score = self._get_collaborative_score(user_id, movie_id)
+        # Resolve the user's rated movies to similarity matrix columns once per request
+        rated_indices, rated_weights = self._get_rated_profile(user_ratings_cache)
 
-            # Get content-based score (normalized to 0-5 scale) - pass cached ratings
-            content_score = self._get_content_score(user_id, movie_id, rated_movie_ids, user_ratings_cache) * 5.0
+        return list(movies_to_predict), rated_indices, rated_weights
 
-            # Compute hybrid score
-            hybrid_score = (
-                    self.collaborative_weight * collab_score +
-                    self.content_weight * content_score
-            )
+    def get_candidate_scores(self, user_id: int):
+        # Scores every candidate movie for the user (not just the top n). The collaborative and
+        # content parts don't depend on the hybrid weights, so callers can re-weight them.
+        movies_to_predict, rated_indices, rated_weights = self._get_candidates(user_id)
+        return self._score_movies(user_id, movies_to_predict, rated_indices, rated_weights, len(movies_to_predict))
+
+    def get_recommendations(self, user_id: int, n: int = 10):
+
+        movies_to_predict, rated_indices, rated_weights = self._get_candidates(user_id)
+
+        if self.n_jobs == 1 or len(movies_to_predict) < self.n_jobs:
+            return self._score_movies(user_id, movies_to_predict, rated_indices, rated_weights, n)
 
-            predictions.append((movie_id, hybrid_score, collab_score, content_score))
+        # Partition the candidates across the pool, keep a local top-N per partition, then merge
+        executor = self._executor
+        partitions = [list(part) for part in np.array_split(movies_to_predict, self.n_jobs) if len(part) > 0]
 
-        # Sort by hybrid score
-        predictions.sort(key=lambda x: x[1], reverse=True)
+        if self.parallel_backend == 'process':
+            futures = [
+                executor.submit(_score_partition_in_worker, user_id, part, rated_indices, rated_weights, n)
+                for part in partitions
+            ]
+        else:
+            futures = [
+                executor.submit(self._score_movies, user_id, part, rated_indices, rated_weights, n)
+                for part in partitions
+            ]
+
+        partial_results = [future.result() for future in futures]
+
+        return heapq.nlargest(n, (pred for part in partial_results for pred in part), key=lambda x: x[1])
+
+    def _get_rated_profile(self, user_ratings: pd.DataFrame):
+        # Maps the user's ratings to (similarity matrix indices, rating / 5.0 weights).
+        rated_indices = []
+        rated_weights = []
+
+        for rated_movie_id, rating in zip(user_ratings['movieId'], user_ratings['rating']):
+            if rated_movie_id in self.movie_id_to_index:
+                rated_indices.append(self.movie_id_to_index[rated_movie_id])
+                rated_weights.append(rating / 5.0)
+
+        return np.array(rated_indices, dtype=np.int64), np.array(rated_weights, dtype=np.float64)
 
-        return predictions[:n]
+    def _score_movies(self, user_id: int, movie_ids, rated_indices: np.ndarray,
+                      rated_weights: np.ndarray, n: int):
+        # Scores a batch of candidate movies and returns its top-n hybrid predictions.
+        movie_ids = list(movie_ids)
+        if not movie_ids:
+            return []
+
+        movie_indices = np.array([self.movie_id_to_index[movie_id] for movie_id in movie_ids])
+
+        # Content scores for the whole batch in one matrix product (average weighted similarity)
+        if len(rated_indices) > 0:
+            similarities = self.content_similarity_matrix[np.ix_(movie_indices, rated_indices)]
+            content_scores = (similarities @ rated_weights) / len(rated_indices) * 5.0
+        else:
+            content_scores = np.zeros(len(movie_ids))
+
+        # Collaborative scores for the whole batch
+        collab_scores = self._get_collaborative_scores(user_id, movie_indices)
+
+        # Compute hybrid scores
+        hybrid_scores = (
+                self.collaborative_weight * collab_scores +
+                self.content_weight * content_scores
+        )
+
+        # Keep only the best n, ordered by hybrid score (stable, so ties keep candidate order)
+        top = np.argsort(-hybrid_scores, kind='stable')[:n]
+        return [
+            (movie_ids[idx], float(hybrid_scores[idx]), float(collab_scores[idx]), float(content_scores[idx]))
+            for idx in top
+        ]
 
     def get_similar_movies(self, movie_id: int, n: int = 10):
 
@@ -213,46 +402,113 @@ class HybridRecommender:
         # Get similarity scores for this movie
         similarity_scores = self.content_similarity_matrix[movie_idx]
 
-        # Create list of (movie_id, similarity)
-        similar_movies = [
-            (self.movies_df.iloc[idx]['movieId'], similarity_scores[idx])
-            for idx in range(len(similarity_scores))
-            if idx != movie_idx  # Exclude the movie itself
-        ]
+        # Sort by similarity (stable, so ties keep catalog order) and exclude the movie itself
+        order = np.argsort(-similarity_scores, kind='stable')
+        order = order[order != movie_idx][:n]
 
-        # Sort by similarity
-        similar_movies.sort(key=lambda x: x[1], reverse=True)
-
-        return similar_movies[:n]
+        # Create list of (movie_id, similarity)
+        movie_ids = self.movies_df['movieId'].values
+        return [(movie_ids[idx], similarity_scores[idx]) for idx in order]
 
     # Explains why a movie was chosen.
     def explain_recommendation(self, user_id: int, movie_id: int) -> dict:
 
-        collab_score = self._get_collaborative_score(user_id, movie_id)
+        explanations = self.explain_recommendations(user_id, [movie_id])
+        return explanations[0] if explanations else None
+
+    # Explains a batch of recommended movies in one pass (one DB query, shared user profile).
+    def explain_recommendations(self, user_id: int, movie_ids, n_neighbors: int = 3,
+                                n_similar: int = 3) -> list:
+
+        movie_ids = [movie_id for movie_id in movie_ids if movie_id in self.movie_id_to_index]
+        if not movie_ids:
+            return []
+
+        # Load the user's ratings once and reuse them for every movie
+        user_ratings = self._get_user_ratings(user_id)
+
+        rated_indices, rated_weights = self._get_rated_profile(user_ratings)
+        movie_indices = np.array([self.movie_id_to_index[movie_id] for movie_id in movie_ids])
+
+        # Content similarity of every requested movie to every rated movie, weighted by rating
+        if len(rated_indices) > 0:
+            similarities = self.content_similarity_matrix[np.ix_(movie_indices, rated_indices)]
+            weighted_similarities = similarities * rated_weights
+            content_scores = weighted_similarities.sum(axis=1) / len(rated_indices) * 5.0
+        else:
+            similarities = weighted_similarities = np.zeros((len(movie_ids), 0))
+            content_scores = np.zeros(len(movie_ids))
+
+        # Collaborative scores and neighbor contributions for the whole batch, as scoring computes them
+        collab_scores = self._get_collaborative_scores(user_id, movie_indices)
+        top_neighbors = self._get_neighbor_contributions(user_id, movie_indices, n_neighbors)
 
+        all_ids = self.movies_df['movieId'].values
+        titles = self.movies_df['title'].values
+        genres = self.movies_df['genres'].values
+
+        explanations = []
+        for row, (movie_id, movie_idx) in enumerate(zip(movie_ids, movie_indices)):
+            collab_score = float(collab_scores[row])
+            content_score = float(content_scores[row])
+            hybrid_score = (
+                    self.collaborative_weight * collab_score +
+                    self.content_weight * content_score
+            )
+
+            # Rated movies that contributed most to the content score
+            top_rated = np.argsort(-weighted_similarities[row], kind='stable')[:n_similar]
+            similar_rated = [{
+                'movie_id': int(all_ids[rated_indices[j]]),
+                'title': titles[rated_indices[j]],
+                'rating': round(float(rated_weights[j] * 5.0), 1),
+                'similarity': round(float(similarities[row, j]), 3),
+                'weight': round(float(weighted_similarities[row, j]), 3)
+            } for j in top_rated if weighted_similarities[row, j] > 0]
+
+            explanations.append({
+                'movie_id': int(movie_id),
+                'title': titles[movie_idx],
+                'genres': genres[movie_idx],
+                'hybrid_score': round(hybrid_score, 2),
+                'collaborative_score': round(collab_score, 2),
+                'content_score': round(content_score, 2),
+                'collaborative_weight': self.collaborative_weight,
+                'content_weight': self.content_weight,
+                'top_neighbors': top_neighbors[row],
+                'similar_rated_movies': similar_rated
+            })
+
+        return explanations
+
+    def _get_neighbor_contributions(self, user_id: int, movie_indices: np.ndarray, n: int) -> list:
+        # For each movie, the n neighbors that moved its collaborative estimate the most: each of
+        # the k selected neighbors pulls it by sim * (rating - neighbor mean) / sum of sims.
+        contributions = [[] for _ in movie_indices]
         try:
             inner_user_id = self.trainset.to_inner_uid(user_id)
-            rated_movies_inner_ids = self.trainset.ur[inner_user_id]
-            rated_movie_ids = {self.trainset.to_raw_iid(inner_id) for inner_id, _ in rated_movies_inner_ids}
         except ValueError:
-            rated_movie_ids = set()
-
-        content_score = self._get_content_score(user_id, movie_id, rated_movie_ids) * 5.0
-        hybrid_score = (
-                self.collaborative_weight * collab_score +
-                self.content_weight * content_score
-        )
-
-        # Get movie details
-        movie_info = self.movies_df[self.movies_df['movieId'] == movie_id].iloc[0]
-
-        return {
-            'movie_id': movie_id,
-            'title': movie_info['title'],
-            'genres': movie_info['genres'],
-            'hybrid_score': round(hybrid_score, 2),
-            'collaborative_score': round(collab_score, 2),
-            'content_score': round(content_score, 2),
-            'collaborative_weight': self.collaborative_weight,
-            'content_weight': self.content_weight
-        }
+            return contributions
+
+        inner_movie_ids = self._catalog_inner_ids[movie_indices]
+        known = np.flatnonzero(inner_movie_ids >= 0)
+        group, entries, sims = self._select_neighbors(inner_user_id, inner_movie_ids[known])
+
+        # Selected neighbors all have positive similarity, so every sum is positive
+        sum_sim = np.bincount(group, weights=sims, minlength=len(known))
+        pulls = sims * self._item_deviations[entries] / sum_sim[group]
+        group_bounds = np.searchsorted(group, np.arange(len(known) + 1))
+
+        for position, row in enumerate(known):
+            start, end = group_bounds[position], group_bounds[position + 1]
+            if end - start < self.model.min_k:
+                continue
+            top = start + np.argsort(-np.abs(pulls[start:end]), kind='stable')[:n]
+            contributions[row] = [{
+                'user_id': int(self.trainset.to_raw_uid(int(self._item_raters[entries[j]]))),
+                'similarity': round(float(sims[j]), 3),
+                'rating': float(self._item_ratings[entries[j]]),
+                'contribution': round(float(pulls[j]), 3)
+            } for j in top]
+
+        return contributions
@@ -0,0 +1,153 @@
+import atexit
+import threading
+import time
+from src.database import get_db_connection, update_movie_stats
+
+
+class RatingWriter:
+    # Write-behind buffer for new ratings. Requests enqueue their rating and return at once;
+    # a single writer thread commits everything queued in one transaction every flush_interval
+    # seconds, or sooner once max_batch ratings are waiting.
+    #
+    # Durability: a rating is only on disk after its batch commits, so a crash can lose up to
+    # flush_interval (or max_batch ratings) of acknowledged writes. close() runs at exit and
+    # flushes whatever is still queued on a clean shutdown; if that last commit fails, the
+    # ratings still queued are dropped, logged and counted in stats()['dropped'].
+
+    def __init__(self, flush_interval: float = 0.005, max_batch: int = 500):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        # Latest pending rating per (userId, movieId): (rating, timestamp, sequence number)
+        self._pending = {}
+        self._submitted = 0
+        self._committed = 0
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._stats = {'batches': 0, 'ratings': 0, 'errors': 0, 'dropped': 0}
+
+        self._thread = threading.Thread(target=self._run, name='rating-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, user_id: int, movie_id: int, rating: float, timestamp: int) -> int:
+        # Queues a rating and returns its sequence number; it is on disk once committed() reaches it.
+        # Re-rating a movie before the flush only keeps the newest value.
+        with self._condition:
+            self._submitted += 1
+            self._pending[(user_id, movie_id)] = (rating, timestamp, self._submitted)
+            self._condition.notify_all()
+            return self._submitted
+
+    def committed(self) -> int:
+        # Sequence number up to which every submitted rating has been committed
+        with self._condition:
+            return self._committed
+
+    def wait_committed(self, after: int, timeout: float = None) -> int:
+        # Blocks until the committed sequence number moves past `after` (or timeout); returns it.
+        with self._condition:
+            self._condition.wait_for(lambda: self._committed > after or self._stopping, timeout=timeout)
+            return self._committed
+
+    def has_pending(self, user_id: int) -> bool:
+        with self._condition:
+            return any(pending_user == user_id for pending_user, _ in self._pending)
+
+    def max_pending_user_id(self):
+        # Highest userId with queued ratings (new users aren't in the ratings table until the flush).
+        with self._condition:
+            return max((user_id for user_id, _ in self._pending), default=None)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        # Blocks until everything submitted so far is committed. Returns False on timeout, or as
+        # soon as a batch fails to commit instead of waiting out the timeout behind a failing writer.
+        with self._condition:
+            target = self._submitted
+            errors = self._stats['errors']
+            self._condition.notify_all()
+            self._condition.wait_for(
+                lambda: self._committed >= target or self._stats['errors'] > errors or self._stopping,
+                timeout=timeout
+            )
+            return self._committed >= target
+
+    def flush_user(self, user_id: int) -> bool:
+        # Read-your-writes: waits for this user's queued ratings before their ratings are read.
+        if self.has_pending(user_id):
+            return self.flush()
+        return True
+
+    def stats(self) -> dict:
+        with self._condition:
+            return dict(self._stats, pending=len(self._pending))
+
+    def close(self):
+        # Stops the writer thread after committing whatever is still queued.
+        with self._condition:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        conn = get_db_connection()
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._stopping)
+                if not self._pending and self._stopping:
+                    break
+
+            # Give the batch a moment to fill up unless it is already large enough
+            deadline = time.monotonic() + self.flush_interval
+            with self._condition:
+                while len(self._pending) < self.max_batch and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = dict(self._pending)
+                batch_end = self._submitted
+
+            try:
+                self._write_batch(conn, batch)
+            except Exception as e:
+                # Keep the ratings queued and try again with the next batch
+                print(f"Rating writer failed to commit {len(batch)} ratings: {e}")
+                conn.rollback()
+                with self._condition:
+                    self._stats['errors'] += 1
+                    self._condition.notify_all()
+                    if self._stopping:
+                        # Shutting down: nothing will retry these, so say how many are lost
+                        self._stats['dropped'] += len(self._pending)
+                        print(f"Rating writer stopped with {len(self._pending)} uncommitted ratings dropped.")
+                        break
+                time.sleep(self.flush_interval)
+                continue
+
+            with self._condition:
+                # Drop committed entries unless they were re-rated while the batch was being written
+                for key, (_, _, sequence) in batch.items():
+                    if self._pending.get(key, (None, None, None))[2] == sequence:
+                        del self._pending[key]
+                # Everything still queued was submitted after the batch was taken
+                self._committed = batch_end
+                self._stats['batches'] += 1
+                self._stats['ratings'] += len(batch)
+                self._condition.notify_all()
+        conn.close()
+
+    @staticmethod
+    def _write_batch(conn, batch: dict):
+        # Writes a batch of ratings and refreshes the touched movies' aggregates in one transaction.
+        conn.executemany(
+            'INSERT OR REPLACE INTO ratings (userId, movieId, rating, timestamp) VALUES (?, ?, ?, ?)',
+            [(user_id, movie_id, rating, timestamp)
+             for (user_id, movie_id), (rating, timestamp, _) in batch.items()]
+        )
+        for movie_id in {movie_id for _, movie_id in batch}:
+            update_movie_stats(conn, movie_id)
+        conn.commit()
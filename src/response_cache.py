@@ -0,0 +1,92 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import request, make_response
+
+
+class ResponseCache:
+    # In-process LRU cache of rendered responses. Callers key entries on the route arguments
+    # plus the model/catalog version, so a new model never serves stale pages.
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _count(self, namespace: str, event: str):
+        stats = self._stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'not_modified': 0, 'warmed': 0})
+        stats[event] += 1
+
+    def get(self, namespace: str, key):
+        # Returns the cached entry (body, mimetype, etag) or None, and records a hit or miss.
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                self._entries.move_to_end((namespace, key))
+            self._count(namespace, 'hits' if entry is not None else 'misses')
+            return entry
+
+    def put(self, namespace: str, key, body: bytes, mimetype: str) -> dict:
+        entry = {'body': body, 'mimetype': mimetype, 'etag': hashlib.sha1(body).hexdigest()}
+        with self._lock:
+            self._entries[(namespace, key)] = entry
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def warm(self, namespace: str, key, build) -> bool:
+        # Builds and stores a response ahead of time (needs a request context). Returns True if cached.
+        with self._lock:
+            if (namespace, key) in self._entries:
+                return False
+
+        response = make_response(build())
+        if response.status_code != 200:
+            return False
+
+        self.put(namespace, key, response.get_data(), response.mimetype)
+        with self._lock:
+            self._count(namespace, 'warmed')
+        return True
+
+    def respond(self, namespace: str, key, build, max_age: int = 300, private: bool = False):
+        # Serves the response for key from the cache, building and storing it on a miss.
+        # Sets ETag and Cache-Control, and answers 304 when If-None-Match matches.
+        entry = self.get(namespace, key)
+        if entry is None:
+            response = make_response(build())
+            if response.status_code != 200:
+                # Redirects and errors are never cached
+                return response
+            entry = self.put(namespace, key, response.get_data(), response.mimetype)
+
+        if request.if_none_match.contains(entry['etag']):
+            with self._lock:
+                self._count(namespace, 'not_modified')
+            response = make_response('', 304)
+        else:
+            response = make_response(entry['body'])
+            response.mimetype = entry['mimetype']
+
+        response.set_etag(entry['etag'])
+        response.cache_control.max_age = max_age
+        if private:
+            response.cache_control.private = True
+        else:
+            response.cache_control.public = True
+        return response
+
+    def stats(self) -> dict:
+        # Hit rates per namespace (a 304 counts as a hit, since it was served from the cache).
+        with self._lock:
+            namespaces = {}
+            for namespace, counts in self._stats.items():
+                lookups = counts['hits'] + counts['misses']
+                namespaces[namespace] = dict(counts, hit_rate=round(counts['hits'] / lookups, 3) if lookups else 0.0)
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'namespaces': namespaces}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()